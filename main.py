@@ -1,15 +1,27 @@
 import asyncio
+import heapq
+import itertools
+import os
+import time
 import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from enum import Enum
+import httpx
+import orjson
+import redis.asyncio as aioredis
+from cachetools import TTLCache
 from fastapi import FastAPI, Query, HTTPException, BackgroundTasks
-from pydantic import BaseModel, HttpUrl
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, HttpUrl
+from playwright.async_api import async_playwright, Browser, Playwright, TimeoutError as PlaywrightTimeoutError
 import logging
 
 # 配置日志
-logging.basicConfig(level=logging.INFO)
+# 日志级别可通过环境变量 LOG_LEVEL 配置，生产环境建议设置为 WARNING
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 
@@ -21,8 +33,14 @@ class TaskStatus(str, Enum):
     FAILED = "failed"
     TIMEOUT = "timeout"
 
+class BrowserState(str, Enum):
+    IDLE = "idle"
+    BUSY = "busy"
+
 # --- Pydantic 模型：用于API数据验证 ---
 class ScrapedLink(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     title: str
     url: str
 
@@ -33,7 +51,7 @@ class TaskInfo(BaseModel):
     created_at: datetime
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
-    result: Optional[List[ScrapedLink]] = None
+    result: Optional[List[Dict[str, str]]] = None  # 直接保存抓取得到的字典，响应时再按 ScrapedLink 序列化
     error: Optional[str] = None
 
 class TaskResponse(BaseModel):
@@ -44,167 +62,740 @@ class TaskResponse(BaseModel):
 
 # --- 全局变量和配置 ---
 # 任务控制配置
-MAX_CONCURRENT_TASKS = 1  # 最大并发任务数（设置为1实现串行处理）
-TASK_TIMEOUT = 300  # 任务超时时间（秒）
-CLEANUP_INTERVAL = 60  # 清理过期任务的间隔（秒）
-
-# 任务存储
-task_queue = asyncio.Queue()
-active_tasks: Dict[str, TaskInfo] = {}
-completed_tasks: Dict[str, TaskInfo] = {}
+# 每个进程的最大并发任务数（每个并发槽位对应一个工作器和一个常驻浏览器），可通过环境变量 MAX_CONCURRENT_TASKS 配置
+MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS") or min(8, os.cpu_count() or 1))
+TASK_TIMEOUT = 300  # 任务默认超时时间（秒），超过截止时间仍未开始的任务不再执行
+MAX_TASK_TIMEOUT = 86400  # 客户端可指定的最大超时时间（秒）
+SHUTDOWN_TIMEOUT = 30  # 关闭服务时等待队列中任务处理完成的最长时间（秒）
+CLEANUP_INTERVAL = 3600  # 没有待过期任务时清理协程的最长休眠时间（秒）
+COMPLETED_TASK_TTL = 3600  # 已完成任务的保留时间（秒）
+MAX_COMPLETED_TASKS = 1000  # 最多保留的已完成任务数量
+SCROLL_MAX_STEPS = 12  # 抓取时最多滚动的次数
+REDIS_URL = os.getenv("REDIS_URL")  # 设置后任务数据保存在 Redis 中，可多进程/多实例共享；未设置时保存在进程内存中
+
+# 结果缓存配置
+RESULT_CACHE_SIZE = 1024  # 最多缓存的抓取结果数量
+RESULT_CACHE_TTL = 600  # 抓取结果缓存时间（秒）
+RESULT_STREAM_CHUNK_SIZE = 500  # 流式返回结果时每个数据块包含的链接数量
+
+# 浏览器池配置
+SYNC_BROWSER_COUNT = 2  # 留给同步接口的浏览器数量（任务工作器会长期占用各自的浏览器）
+SYNC_ACQUIRE_TIMEOUT = 30  # 同步接口等待空闲浏览器的最长时间（秒），超时返回 503
+BROWSER_POOL_SIZE = MAX_CONCURRENT_TASKS + SYNC_BROWSER_COUNT  # 浏览器池最大容量
+BROWSER_POOL_MIN_SIZE = MAX_CONCURRENT_TASKS  # 启动时预热的浏览器数量
+BROWSER_LAUNCH_ARGS = ["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
+PROBE_TIMEOUT = 5  # 启动浏览器前探测 URL 内容类型的超时时间（秒）
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}  # 与链接提取无关的资源类型，直接拦截
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# 并发控制
 task_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
 
+# 后台任务和关闭信号
+background_tasks: List[asyncio.Task] = []
+shutdown_requested = asyncio.Event()
+
+# 结果缓存：(URL, 滚动参数) -> 链接列表；所有访问都在事件循环线程内且不跨越 await，无需额外加锁
+result_cache: TTLCache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+pending_by_url: Dict[Tuple[str, int], asyncio.Future] = {}  # 正在抓取中的 URL，用于合并重复请求
+
+
+# --- 浏览器池 ---
+class PooledBrowser:
+    """浏览器池中的单个浏览器实例"""
+
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.created_at = datetime.now()
+        self.usage_count = 0
+        self.state = BrowserState.IDLE
+
+
+class BrowserPool:
+    """
+    进程级浏览器池：启动时预热若干 Chromium 实例并常驻复用，
+    每个任务只创建/销毁自己的 BrowserContext，避免每次请求冷启动浏览器。
+    """
+
+    def __init__(self, max_size: int, min_size: int = 1):
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self._playwright: Optional[Playwright] = None
+        self._browsers: List[PooledBrowser] = []
+        self._condition = asyncio.Condition()
+        self._pending_launch: Optional[asyncio.Future] = None
+
+    async def initialize(self):
+        """启动 Playwright 并预热浏览器"""
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        while len(self._browsers) < self.min_size:
+            await self._launch_shared()
+        logger.info("浏览器池已初始化: %d/%d 个浏览器", len(self._browsers), self.max_size)
+
+    async def close(self):
+        """关闭所有浏览器并停止 Playwright"""
+        browsers, self._browsers = self._browsers, []
+        for pooled in browsers:
+            try:
+                await pooled.browser.close()
+            except Exception as e:
+                logger.error("关闭浏览器失败: %s", e)
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _launch_browser(self):
+        browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+        async with self._condition:
+            self._browsers.append(PooledBrowser(browser))
+            self._condition.notify_all()
+
+    def _clear_pending_launch(self, future: asyncio.Future):
+        if self._pending_launch is future:
+            self._pending_launch = None
+
+    async def _launch_shared(self):
+        """启动一个新浏览器；并发的获取者共享同一次启动，避免重复拉起进程"""
+        if self._pending_launch is None:
+            self._pending_launch = asyncio.ensure_future(self._launch_browser())
+            self._pending_launch.add_done_callback(self._clear_pending_launch)
+        await asyncio.shield(self._pending_launch)
+
+    async def _checkout(self) -> PooledBrowser:
+        while True:
+            async with self._condition:
+                for pooled in list(self._browsers):
+                    if pooled.state != BrowserState.IDLE:
+                        continue
+                    # 健康检查：丢弃已断开连接的浏览器
+                    if not pooled.browser.is_connected():
+                        self._browsers.remove(pooled)
+                        logger.warning("丢弃已断开连接的浏览器")
+                        continue
+                    pooled.state = BrowserState.BUSY
+                    pooled.usage_count += 1
+                    return pooled
+
+                if self._pending_launch is None and len(self._browsers) >= self.max_size:
+                    await self._condition.wait()
+                    continue
+
+            await self._launch_shared()
+
+    async def _release(self, pooled: PooledBrowser):
+        async with self._condition:
+            if pooled.browser.is_connected():
+                pooled.state = BrowserState.IDLE
+            elif pooled in self._browsers:
+                self._browsers.remove(pooled)
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None):
+        """从池中借出一个浏览器，使用完毕后自动归还；超过 timeout 秒仍未借到时抛出 asyncio.TimeoutError"""
+        pooled = await asyncio.wait_for(self._checkout(), timeout)
+        try:
+            yield pooled.browser
+        finally:
+            await self._release(pooled)
+
+
+browser_pool = BrowserPool(max_size=BROWSER_POOL_SIZE, min_size=BROWSER_POOL_MIN_SIZE)
+
+# 用于在启动浏览器前探测 URL 内容类型的共享 HTTP 客户端
+http_client = httpx.AsyncClient(http2=True, timeout=PROBE_TIMEOUT, headers={"User-Agent": USER_AGENT})
+
+
+# --- 任务存储 ---
+class MemoryTaskStore:
+    """进程内任务存储（默认）：按截止时间排序的优先级队列，有界的已完成任务字典和过期时间最小堆"""
+
+    def __init__(self):
+        self._queue = asyncio.PriorityQueue()  # 元素为 (截止时间, 序号, 任务)，截止时间最早的任务优先处理
+        self._sequence = itertools.count()  # 截止时间相同时按提交顺序处理
+        self._pending: Dict[str, TaskInfo] = {}  # 排队中尚未开始的任务，便于查询状态
+        self._active: Dict[str, TaskInfo] = {}
+        self._completed: "OrderedDict[str, TaskInfo]" = OrderedDict()  # 按完成顺序排列，超出上限时淘汰最旧的
+        self._expiry_heap: List[Tuple[float, str]] = []  # (过期时间 time.monotonic(), 任务ID) 最小堆
+        self._cleanup_wake = asyncio.Event()  # 出现更早的过期时间时唤醒清理协程
+
+    async def put(self, task_info: TaskInfo, timeout: float):
+        """将任务按截止时间添加到队列"""
+        deadline = time.monotonic() + timeout
+        self._pending[task_info.task_id] = task_info
+        await self._queue.put((deadline, next(self._sequence), task_info))
+
+    async def get(self) -> Tuple[TaskInfo, bool]:
+        """取出截止时间最早的任务，并返回其是否已超过截止时间"""
+        deadline, _, task_info = await self._queue.get()
+        self._pending.pop(task_info.task_id, None)
+        return task_info, time.monotonic() > deadline
+
+    def task_done(self):
+        self._queue.task_done()
+
+    async def join(self):
+        """等待队列中的任务全部处理完成"""
+        await self._queue.join()
+
+    async def mark_active(self, task_info: TaskInfo):
+        self._active[task_info.task_id] = task_info
+
+    async def complete(self, task_info: TaskInfo):
+        """将任务移动到已完成任务中，并登记过期时间"""
+        task_id = task_info.task_id
+        self._completed[task_id] = task_info
+        self._active.pop(task_id, None)
+        deadline = time.monotonic() + COMPLETED_TASK_TTL
+        # 仅当新任务比当前堆顶更早过期时才需要唤醒清理协程重新计算休眠时间
+        if not self._expiry_heap or deadline < self._expiry_heap[0][0]:
+            self._cleanup_wake.set()
+        heapq.heappush(self._expiry_heap, (deadline, task_id))
+
+        # 超出容量上限时按完成顺序淘汰最旧的任务
+        while len(self._completed) > MAX_COMPLETED_TASKS:
+            self._completed.popitem(last=False)
+
+        # 被淘汰任务的过期条目仍留在堆中，堆过大时只保留仍存在的任务，保证内存有界
+        if len(self._expiry_heap) > 2 * MAX_COMPLETED_TASKS:
+            self._expiry_heap = [entry for entry in self._expiry_heap if entry[1] in self._completed]
+            heapq.heapify(self._expiry_heap)
+
+    async def get_task(self, task_id: str) -> Optional[TaskInfo]:
+        for tasks in (self._pending, self._active, self._completed):
+            task_info = tasks.get(task_id)
+            if task_info is not None:
+                return task_info
+        return None
+
+    async def get_completed(self, task_id: str) -> Optional[TaskInfo]:
+        return self._completed.get(task_id)
+
+    async def wait_for_expiry(self):
+        """休眠到下一个任务过期为止，有更早的过期时间时被提前唤醒"""
+        wait = self._expiry_heap[0][0] - time.monotonic() if self._expiry_heap else CLEANUP_INTERVAL
+        try:
+            await asyncio.wait_for(self._cleanup_wake.wait(), timeout=max(wait, 0))
+        except asyncio.TimeoutError:
+            pass
+        self._cleanup_wake.clear()
+
+    async def cleanup_expired(self):
+        """清理过期的已完成任务（只处理堆顶已过期的条目）"""
+        now = time.monotonic()
+
+        while self._expiry_heap and self._expiry_heap[0][0] < now:
+            _, task_id = heapq.heappop(self._expiry_heap)
+            if self._completed.pop(task_id, None) is not None:
+                logger.info("清理过期任务: %s", task_id)
+
+    async def stats(self) -> Dict[str, int]:
+        return {
+            "queue_size": self._queue.qsize(),
+            "active_tasks": len(self._active),
+            "completed_tasks": len(self._completed),
+        }
+
+    async def close(self):
+        pass
+
+
+class RedisTaskStore:
+    """
+    基于 Redis 的任务存储：每个任务保存为 task:{id} 哈希，队列和过期时间使用有序集合，
+    多个进程（uvicorn --workers）或多个实例可以共享同一套任务数据，服务重启后排队中的任务也不会丢失。
+    """
+
+    QUEUE_KEY = "task_queue"  # 有序集合：任务ID -> 截止时间戳
+    EXPIRY_KEY = "task_expiry"  # 有序集合：已完成任务ID -> 过期时间戳
+    ACTIVE_KEY = "task_active"  # 集合：处理中的任务ID
+    POLL_TIMEOUT = 1  # 阻塞等待队列的超时时间（秒），超时后重新检查是否停止取任务
+
+    def __init__(self, url: str):
+        self._redis = aioredis.from_url(url)
+        self._accepting = True
+        self._unfinished = 0  # 本进程已取出但尚未处理完成的任务数量
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"task:{task_id}"
+
+    def _save(self, pipe, task_info: TaskInfo):
+        pipe.hset(self._key(task_info.task_id), mapping={
+            "status": task_info.status.value,
+            "data": task_info.model_dump_json(),
+        })
+
+    async def put(self, task_info: TaskInfo, timeout: float):
+        """保存任务并按截止时间加入队列；任务数据设置过期时间，未能完成的任务（如进程退出）也会被 Redis 自动清除"""
+        key = self._key(task_info.task_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._save(pipe, task_info)
+            pipe.expire(key, timedelta(seconds=timeout + COMPLETED_TASK_TTL))
+            pipe.zadd(self.QUEUE_KEY, {task_info.task_id: time.time() + timeout})
+            await pipe.execute()
+
+    async def get(self) -> Tuple[TaskInfo, bool]:
+        """取出截止时间最早的任务，并返回其是否已超过截止时间"""
+        while True:
+            if not self._accepting:
+                await asyncio.sleep(self.POLL_TIMEOUT)
+                continue
+            item = await self._redis.bzpopmin(self.QUEUE_KEY, timeout=self.POLL_TIMEOUT)
+            if item is None:
+                continue
+            _, task_id, deadline = item
+            # 取出任务后立即计入未完成数量，避免 join() 在读取任务数据期间提前返回
+            self._unfinished += 1
+            self._idle.clear()
+            try:
+                task_info = await self.get_task(task_id.decode())
+            except BaseException:
+                self.task_done()
+                raise
+            if task_info is None:
+                self.task_done()
+                continue
+            return task_info, time.time() > deadline
+
+    def task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._idle.set()
+
+    async def join(self):
+        """停止从共享队列取任务，并等待本进程已取出的任务处理完成；排队中的任务留给其他进程处理"""
+        self._accepting = False
+        await self._idle.wait()
+
+    async def mark_active(self, task_info: TaskInfo):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._save(pipe, task_info)
+            pipe.sadd(self.ACTIVE_KEY, task_info.task_id)
+            await pipe.execute()
+
+    async def complete(self, task_info: TaskInfo):
+        """保存任务结果，并登记过期时间"""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._save(pipe, task_info)
+            pipe.expire(self._key(task_info.task_id), COMPLETED_TASK_TTL)
+            pipe.srem(self.ACTIVE_KEY, task_info.task_id)
+            pipe.zadd(self.EXPIRY_KEY, {task_info.task_id: time.time() + COMPLETED_TASK_TTL})
+            await pipe.execute()
+
+    async def get_task(self, task_id: str) -> Optional[TaskInfo]:
+        data = await self._redis.hget(self._key(task_id), "data")
+        return TaskInfo.model_validate_json(data) if data is not None else None
+
+    async def get_completed(self, task_id: str) -> Optional[TaskInfo]:
+        task_info = await self.get_task(task_id)
+        if task_info is None or task_info.status in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+            return None
+        return task_info
+
+    async def wait_for_expiry(self):
+        """休眠到共享有序集合中下一个任务过期为止（任何进程都会清理所有进程登记的任务），最长休眠 CLEANUP_INTERVAL"""
+        head = await self._redis.zrange(self.EXPIRY_KEY, 0, 0, withscores=True)
+        wait = head[0][1] - time.time() if head else CLEANUP_INTERVAL
+        await asyncio.sleep(min(max(wait, 0), CLEANUP_INTERVAL))
+
+    async def cleanup_expired(self):
+        """清理过期的已完成任务，并移除任务数据已被 Redis 过期清除的处理中任务"""
+        expired = await self._redis.zrangebyscore(self.EXPIRY_KEY, 0, time.time())
+        if expired:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.delete(*(self._key(task_id.decode()) for task_id in expired))
+                pipe.zrem(self.EXPIRY_KEY, *expired)
+                await pipe.execute()
+            logger.info("清理过期任务: %d 个", len(expired))
+
+        active = list(await self._redis.smembers(self.ACTIVE_KEY))
+        if not active:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for task_id in active:
+                pipe.exists(self._key(task_id.decode()))
+            exists = await pipe.execute()
+        stale = [task_id for task_id, found in zip(active, exists) if not found]
+        if stale:
+            await self._redis.srem(self.ACTIVE_KEY, *stale)
+            logger.info("清理失效的处理中任务: %d 个", len(stale))
+
+    async def stats(self) -> Dict[str, int]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zcard(self.QUEUE_KEY)
+            pipe.scard(self.ACTIVE_KEY)
+            pipe.zcard(self.EXPIRY_KEY)
+            queue_size, active, completed = await pipe.execute()
+        return {
+            "queue_size": queue_size,
+            "active_tasks": active,
+            "completed_tasks": completed,
+        }
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+task_store = RedisTaskStore(REDIS_URL) if REDIS_URL else MemoryTaskStore()
+
 # --- FastAPI 应用初始化 ---
 app = FastAPI(
     title="网页抓取 API",
-    description="一个使用 Playwright 从给定 URL 抓取所有链接的 API，支持任务队列和串行处理。",
+    description="一个使用 Playwright 从给定 URL 抓取所有链接的 API，支持任务队列和并发处理。",
     version="2.0.0",
+    default_response_class=ORJSONResponse,  # 使用 orjson 序列化响应，比标准库 json 更快
 )
 
 
 # --- 任务管理函数 ---
-async def cleanup_expired_tasks():
-    """清理过期的已完成任务"""
-    current_time = datetime.now()
-    expired_tasks = []
-    
-    for task_id, task in completed_tasks.items():
-        if task.completed_at and (current_time - task.completed_at).seconds > 3600:  # 1小时后清理
-            expired_tasks.append(task_id)
-    
-    for task_id in expired_tasks:
-        del completed_tasks[task_id]
-        logger.info(f"清理过期任务: {task_id}")
-
 async def task_worker():
-    """任务工作器，从队列中获取任务并串行处理"""
-    while True:
+    """任务工作器：独占一个浏览器并固定复用一个页面，从队列中获取任务并处理"""
+    while not shutdown_requested.is_set():
         try:
-            # 等待队列中的任务
-            task_info = await task_queue.get()
-            task_id = task_info.task_id
-            
-            # 获取信号量（串行处理，一次只处理一个任务）
-            async with task_semaphore:
+            async with browser_pool.acquire() as browser:
+                context = await new_crawl_context(browser)
                 try:
-                    # 更新任务状态为处理中
-                    task_info.status = TaskStatus.PROCESSING
-                    task_info.started_at = datetime.now()
-                    active_tasks[task_id] = task_info
-                    
-                    logger.info(f"开始处理任务: {task_id}, URL: {task_info.url}")
-                    
-                    # 执行爬虫任务
-                    result = await crawl_list_page(task_info.url)
-                    
-                    # 任务完成
-                    task_info.status = TaskStatus.COMPLETED
-                    task_info.completed_at = datetime.now()
-                    task_info.result = [ScrapedLink(**item) for item in result]
-                    
-                    # 移动到已完成任务
-                    completed_tasks[task_id] = task_info
-                    if task_id in active_tasks:
-                        del active_tasks[task_id]
-                    
-                    logger.info(f"任务完成: {task_id}, 找到 {len(result)} 个链接")
-                    
-                except Exception as e:
-                    # 任务失败
-                    task_info.status = TaskStatus.FAILED
-                    task_info.completed_at = datetime.now()
-                    task_info.error = str(e)
-                    
-                    completed_tasks[task_id] = task_info
-                    if task_id in active_tasks:
-                        del active_tasks[task_id]
-                    
-                    logger.error(f"任务失败: {task_id}, 错误: {str(e)}")
-                
+                    page = await context.new_page()
+                    await process_tasks(page)
                 finally:
-                    task_queue.task_done()
-                    
+                    await context.close()
         except Exception as e:
-            logger.error(f"任务工作器错误: {str(e)}")
+            logger.error("任务工作器错误: %s", e)
             await asyncio.sleep(1)
 
+async def process_tasks(page):
+    """使用固定的页面循环处理队列中的任务，页面崩溃或浏览器断开时返回以便重建"""
+    # 渲染进程崩溃后页面不会被关闭，但之后的所有操作都会失败；浏览器断开同理，都需要重建上下文
+    crashed = asyncio.Event()
+    browser = page.context.browser
+    on_crash = lambda _: crashed.set()
+    page.on("crash", on_crash)
+    browser.on("disconnected", on_crash)
+    if not browser.is_connected():
+        crashed.set()
+    try:
+        await run_tasks(page, crashed)
+    finally:
+        # 浏览器可能被下一个上下文继续使用，移除监听器避免重复注册
+        browser.remove_listener("disconnected", on_crash)
+
+async def run_tasks(page, crashed: asyncio.Event):
+    """在页面可用期间循环处理任务；取下一个任务前先检查页面和浏览器状态"""
+    while not (crashed.is_set() or page.is_closed()):
+        # 等待队列中的任务
+        task_info, expired = await task_store.get()
+        task_id = task_info.task_id
+        
+        # 获取信号量（限制同时执行的任务数量）
+        async with task_semaphore:
+            try:
+                # 已超过截止时间的任务直接标记为超时，不再浪费抓取资源
+                if expired:
+                    task_info.status = TaskStatus.TIMEOUT
+                    task_info.completed_at = datetime.now()
+                    task_info.error = "任务在截止时间前未能开始执行"
+
+                    await task_store.complete(task_info)
+
+                    logger.warning("任务超时: %s, URL: %s", task_id, task_info.url)
+                    continue
+
+                # 更新任务状态为处理中
+                task_info.status = TaskStatus.PROCESSING
+                task_info.started_at = datetime.now()
+                await task_store.mark_active(task_info)
+                
+                logger.info("开始处理任务: %s, URL: %s", task_id, task_info.url)
+                
+                # 执行爬虫任务
+                result = await crawl_with_cache(task_info.url, page)
+                
+                # 任务完成
+                task_info.status = TaskStatus.COMPLETED
+                task_info.completed_at = datetime.now()
+                task_info.result = result
+                
+                # 移动到已完成任务
+                await task_store.complete(task_info)
+                
+                logger.info("任务完成: %s, 找到 %d 个链接", task_id, len(result))
+
+            except asyncio.CancelledError:
+                # 服务关闭时任务被取消：记录状态后继续向上传播取消，由上层关闭浏览器上下文
+                task_info.status = TaskStatus.FAILED
+                task_info.completed_at = datetime.now()
+                task_info.error = "服务关闭，任务被取消"
+
+                await task_store.complete(task_info)
+                raise
+                
+            except Exception as e:
+                # 任务失败
+                task_info.status = TaskStatus.FAILED
+                task_info.completed_at = datetime.now()
+                task_info.error = str(e)
+                
+                await task_store.complete(task_info)
+                
+                logger.error("任务失败: %s, 错误: %s", task_id, e)
+            
+            finally:
+                task_store.task_done()
+
+    logger.warning("页面已崩溃或浏览器已断开，重建浏览器上下文")
+
 async def start_background_tasks():
     """启动后台任务"""
-    # 启动单个任务工作器（串行处理）
-    asyncio.create_task(task_worker())
+    # 每个并发槽位启动一个任务工作器，共享同一个浏览器池
+    for _ in range(MAX_CONCURRENT_TASKS):
+        background_tasks.append(asyncio.create_task(task_worker()))
     
-    # 启动清理任务
+    # 启动清理任务：休眠到下一个任务过期为止再清理
     async def cleanup_loop():
         while True:
-            await asyncio.sleep(CLEANUP_INTERVAL)
-            await cleanup_expired_tasks()
+            try:
+                await task_store.wait_for_expiry()
+                await task_store.cleanup_expired()
+            except Exception as e:
+                logger.error("清理任务错误: %s", e)
+                await asyncio.sleep(1)
     
-    asyncio.create_task(cleanup_loop())
-    logger.info("启动单个任务工作器（串行处理）和清理任务")
+    background_tasks.append(asyncio.create_task(cleanup_loop()))
+    logger.info("启动 %d 个任务工作器和清理任务", MAX_CONCURRENT_TASKS)
 
 # --- 异步爬虫函数 ---
-async def auto_scroll(page, max_steps=15, delay=1):
-    """异步滚动页面，以触发懒加载内容。"""
-    last_height = await page.evaluate("() => document.body.scrollHeight")
+# 在浏览器端批量提取链接，避免每个 <a> 元素都进行多次 CDP 往返。
+# 已是规范形式的纯 ASCII 绝对、协议相对和根相对地址直接拼接，
+# 其余可能需要编码或规范化的地址（空白、反斜杠、%、点号路径段、大写或带端口的主机名等）回退到 new URL() 解析
+EXTRACT_LINKS_JS = """() => {
+  const base = document.baseURI;
+  const scheme = base.slice(0, base.indexOf(':') + 1);
+  const slash = base.indexOf('/', scheme.length + 2);
+  const origin = slash > 0 ? base.slice(0, slash) : base;
+  const plain = /^[!-~]+$/;
+  const unsafe = /[\\\\%"'<>`{}|^]|[/][.]/;
+  const absolute = /^https?:[/][/]([a-z0-9-]+[.])*[a-z][a-z0-9-]*[/]/;
+  const out = [];
+  for (const a of document.querySelectorAll('a[href]')) {
+    const t = a.innerText;
+    if (!t) continue;
+    const title = t.trim();
+    if (!title) continue;
+    let h = a.getAttribute('href');
+    if (!h) continue;
+    let url = null;
+    if (plain.test(h) && !unsafe.test(h)) {
+      if (h.startsWith('//')) h = scheme + h;
+      if (h.startsWith('/')) url = origin + h;
+      else if (absolute.test(h)) url = h;
+    }
+    if (url === null) url = new URL(h, base).href;
+    out.push({title: title, url: url});
+  }
+  return out;
+}"""
+
+# 每个页面加载时预先注入的辅助函数，之后通过函数名调用，避免每次 evaluate 都传输并重新编译脚本
+SCRAPER_INIT_JS = f"""window.__scraper = {{
+  height: () => document.body.scrollHeight,
+  extract: {EXTRACT_LINKS_JS},
+}};"""
+
+
+async def block_unneeded_resources(route):
+    """拦截图片、字体、媒体和样式表等与链接提取无关的请求，减少网络传输。"""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def auto_scroll(page, max_steps=15, timeout=1500):
+    """异步滚动页面，以触发懒加载内容；页面高度不再增长时立即停止。"""
     for _ in range(max_steps):
-        await page.mouse.wheel(0, 2000)  # 异步操作需要使用 await
-        await asyncio.sleep(delay)  # 在异步函数中使用 asyncio.sleep
-        new_height = await page.evaluate("() => document.body.scrollHeight")
-        if new_height == last_height:
-            break
-        last_height = new_height
+        last_height = await page.evaluate("window.__scraper.height()")
+        await page.mouse.wheel(0, 2000)
+        try:
+            # 等待页面高度增长，而不是固定休眠
+            await page.wait_for_function(
+                "h => window.__scraper.height() > h", arg=last_height, timeout=timeout
+            )
+        except PlaywrightTimeoutError:
+            break  # 没有更多懒加载内容
+
+    try:
+        await page.wait_for_load_state("networkidle", timeout=2000)
+    except PlaywrightTimeoutError:
+        pass
+
+
+async def new_crawl_context(browser: Browser):
+    """创建用于抓取的浏览器上下文，拦截无关资源并注入页面辅助函数"""
+    context = await browser.new_context(
+        user_agent=USER_AGENT,
+        java_script_enabled=True,  # 懒加载依赖 JS
+        service_workers="block"
+    )
+    await context.route("**/*", block_unneeded_resources)
+    await context.add_init_script(SCRAPER_INIT_JS)
+    return context
+
+
+async def scrape_page(page, url: str):
+    """使用给定页面导航到指定URL，滚动页面，然后抓取所有链接。"""
+    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+    await page.wait_for_selector("body")
 
+    # 滚动页面以触发懒加载
+    await auto_scroll(page, max_steps=SCROLL_MAX_STEPS)
 
-async def crawl_list_page(url: str):
+    # 在页面内一次性抓取所有链接（并将相对 URL 解析为绝对 URL）
+    return await page.evaluate("window.__scraper.extract()")
+
+
+async def reset_page(page):
     """
-    异步启动一个无头浏览器，导航到指定URL，滚动页面，然后抓取所有链接。
+    导航到空白页释放上一次任务的 DOM，并清除 Cookie 保证任务之间相互隔离。
+    重置失败说明页面已不可用，直接关闭页面，由工作器重建上下文。
     """
-    results = []
-    async with async_playwright() as p:
+    if page.is_closed():
+        return
+    try:
+        await page.goto("about:blank")
+        await page.context.clear_cookies()
+    except Exception as e:
+        logger.warning("重置页面失败，关闭页面: %s", e)
         try:
-            # 对于服务器环境，headless=True (无头模式) 是最佳选择
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            )
-            page = await context.new_page()
-
-            await page.goto(url, timeout=60000, wait_until="domcontentloaded")
-            await page.wait_for_selector("body")
-
-            # 滚动页面以触发懒加载
-            await auto_scroll(page, max_steps=12, delay=1)
-
-            # 抓取所有链接
-            links = await page.query_selector_all("a")
-            for a in links:
-                href = await a.get_attribute("href")
-                text = (await a.inner_text() or "").strip()
-                if href and text:
-                    # 将相对 URL 解析为绝对 URL
-                    absolute_url = await page.evaluate("(url) => new URL(url, document.baseURI).href", href)
-                    results.append({
-                        "title": text,
-                        "url": absolute_url
-                    })
-
-            await browser.close()
-        except PlaywrightTimeoutError:
-            raise HTTPException(status_code=408, detail=f"访问URL超时: {url}")
-        except Exception as e:
-            # 捕获其他在抓取过程中可能发生的错误
-            raise HTTPException(status_code=500, detail=f"发生意外错误: {str(e)}")
+            await page.close()
+        except Exception:
+            pass
+
+
+async def ensure_html(url: str):
+    """
+    在占用浏览器前先发送 HEAD 请求，明确返回非 HTML 内容（如 PDF、图片）的 URL 直接拒绝。
+    探测失败或服务器不支持 HEAD 时不做判断，交由浏览器处理。
+    """
+    try:
+        response = await http_client.head(url, follow_redirects=True)
+    except httpx.HTTPError:
+        return
+
+    content_type = response.headers.get("content-type", "")
+    if response.is_success and content_type and "text/html" not in content_type and "xml" not in content_type:
+        raise HTTPException(status_code=415, detail=f"URL 内容不是 HTML 页面: {content_type}")
 
-    return results
+
+async def crawl_list_page(url: str, page=None):
+    """
+    抓取指定URL上的所有链接。
+    传入 page 时复用该页面，完成后导航到空白页释放 DOM；
+    否则从浏览器池借出一个无头浏览器，使用一次性的上下文和页面。
+    """
+    await ensure_html(url)
+
+    try:
+        if page is not None:
+            try:
+                return await scrape_page(page, url)
+            finally:
+                await reset_page(page)
+
+        async with browser_pool.acquire(timeout=SYNC_ACQUIRE_TIMEOUT) as browser:
+            # 浏览器常驻复用，仅上下文和页面按请求创建和销毁
+            context = await new_crawl_context(browser)
+            try:
+                return await scrape_page(await context.new_page(), url)
+            finally:
+                await context.close()
+    except PlaywrightTimeoutError:
+        raise HTTPException(status_code=408, detail=f"访问URL超时: {url}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="浏览器繁忙，请稍后重试")
+    except Exception as e:
+        # 捕获其他在抓取过程中可能发生的错误
+        raise HTTPException(status_code=500, detail=f"发生意外错误: {str(e)}")
+
+
+def result_cache_key(url: str) -> Tuple[str, int]:
+    return (url, SCROLL_MAX_STEPS)
+
+
+async def crawl_with_cache(url: str, page=None):
+    """
+    带结果缓存的抓取：命中缓存时直接返回；同一 URL 的并发请求共享一次浏览器抓取。
+    """
+    key = result_cache_key(url)
+    # 直接 get 而不是先判断再读取：TTLCache 的条目可能在两次访问之间过期
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # 已有相同 URL 正在抓取，等待其结果
+    pending = pending_by_url.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    pending_by_url[key] = future
+    try:
+        results = await crawl_list_page(url, page)
+    except asyncio.CancelledError:
+        # 不能把取消传播给其他等待者，只让它们的抓取失败
+        future.set_exception(HTTPException(status_code=503, detail=f"抓取被取消: {url}"))
+        future.exception()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # 标记异常已被读取，避免无人等待时产生警告
+        raise
+    else:
+        result_cache[key] = results
+        future.set_result(results)
+        return results
+    finally:
+        pending_by_url.pop(key, None)
 
 
 # --- 应用启动事件 ---
 @app.on_event("startup")
 async def startup_event():
-    """应用启动时初始化后台任务"""
+    """应用启动时初始化浏览器池和后台任务"""
+    await browser_pool.initialize()
     await start_background_tasks()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时等待队列中的任务处理完成，然后取消后台任务并释放浏览器池"""
+    shutdown_requested.set()
+    try:
+        await asyncio.wait_for(task_store.join(), timeout=SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("等待队列任务完成超时，剩余任务将被取消")
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+    await browser_pool.close()
+    await http_client.aclose()
+    await task_store.close()
+
 # --- API 接口定义 ---
+async def stream_links_json(links: List[Dict[str, str]]):
+    """按块将链接列表序列化为 JSON 数组，避免一次性构建完整响应体（异步生成器，不占用线程池）"""
+    yield b"["
+    for start in range(0, len(links), RESULT_STREAM_CHUNK_SIZE):
+        # 去掉每个数据块序列化结果两端的方括号，再拼接成一个完整数组
+        chunk = orjson.dumps(links[start:start + RESULT_STREAM_CHUNK_SIZE])[1:-1]
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]"
+
 @app.post(
     "/scrape",
     response_model=TaskResponse,
@@ -212,12 +803,17 @@ async def startup_event():
     description="提交一个URL抓取任务到队列中，返回任务ID用于查询状态。"
 )
 async def submit_scrape_task(
-        url: HttpUrl = Query(..., description="需要抓取的完整URL。例如: https://www.google.com")
+        url: HttpUrl = Query(..., description="需要抓取的完整URL。例如: https://www.google.com"),
+        timeout: int = Query(TASK_TIMEOUT, gt=0, le=MAX_TASK_TIMEOUT, description="任务超时时间（秒），超过该时间仍未开始执行的任务将被标记为超时")
 ):
     """
     提交一个抓取任务到队列中。
     - **url**: 需要被抓取的目标URL，必须是合法的URL格式。
+    - **timeout**: 任务超时时间（秒），队列按截止时间优先调度。
     """
+    if shutdown_requested.is_set():
+        raise HTTPException(status_code=503, detail="服务正在关闭，暂不接受新任务")
+
     task_id = str(uuid.uuid4())
     task_info = TaskInfo(
         task_id=task_id,
@@ -225,11 +821,27 @@ async def submit_scrape_task(
         url=str(url),
         created_at=datetime.now()
     )
+
+    # 命中结果缓存时直接完成任务，无需进入队列
+    cached = result_cache.get(result_cache_key(task_info.url))
+    if cached is not None:
+        task_info.status = TaskStatus.COMPLETED
+        task_info.started_at = task_info.completed_at = datetime.now()
+        task_info.result = cached
+        await task_store.complete(task_info)
+
+        logger.info("任务命中缓存: %s, URL: %s", task_id, url)
+
+        return TaskResponse(
+            task_id=task_id,
+            status=TaskStatus.COMPLETED,
+            message="命中缓存，任务已完成，请使用任务ID获取结果"
+        )
+
+    # 将任务按截止时间添加到队列
+    await task_store.put(task_info, timeout)
     
-    # 将任务添加到队列
-    await task_queue.put(task_info)
-    
-    logger.info(f"新任务已提交: {task_id}, URL: {url}")
+    logger.info("新任务已提交: %s, URL: %s", task_id, url)
     
     return TaskResponse(
         task_id=task_id,
@@ -248,13 +860,10 @@ async def get_task_status(task_id: str):
     查询指定任务的状态和结果。
     - **task_id**: 任务ID，由提交任务接口返回。
     """
-    # 检查活跃任务
-    if task_id in active_tasks:
-        return active_tasks[task_id]
-    
-    # 检查已完成任务
-    if task_id in completed_tasks:
-        return completed_tasks[task_id]
+    # 检查活跃任务和已完成任务
+    task_info = await task_store.get_task(task_id)
+    if task_info is not None:
+        return task_info
     
     raise HTTPException(status_code=404, detail="任务不存在或已过期")
 
@@ -269,17 +878,17 @@ async def get_task_result(task_id: str):
     获取已完成任务的抓取结果。
     - **task_id**: 任务ID，由提交任务接口返回。
     """
-    if task_id not in completed_tasks:
+    task = await task_store.get_completed(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在或未完成")
     
-    task = completed_tasks[task_id]
     if task.status != TaskStatus.COMPLETED:
         raise HTTPException(status_code=400, detail=f"任务状态为 {task.status}，无法获取结果")
     
     if not task.result:
         raise HTTPException(status_code=404, detail="任务结果为空")
     
-    return task.result
+    return StreamingResponse(stream_links_json(task.result), media_type="application/json")
 
 @app.get(
     "/scrape/sync",
@@ -295,10 +904,13 @@ async def scrape_links_from_url_sync(
     - **url**: 需要被抓取的目标URL，必须是合法的URL格式。
     """
     try:
-        scraped_data = await crawl_list_page(str(url))
+        scraped_data = await crawl_with_cache(str(url))
         if not scraped_data:
             raise HTTPException(status_code=404, detail="在页面上没有找到同时包含文本和链接地址的链接。")
         return scraped_data
+    except HTTPException:
+        # 保留 404、408、415 等明确的状态码
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"抓取失败: {str(e)}")
 
@@ -312,9 +924,7 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "queue_size": task_queue.qsize(),
-        "active_tasks": len(active_tasks),
-        "completed_tasks": len(completed_tasks),
+        **await task_store.stats(),
         "max_concurrent_tasks": MAX_CONCURRENT_TASKS
     }
 
@@ -323,5 +933,5 @@ async def health_check():
 if __name__ == "__main__":
     import uvicorn
 
-    # 生产环境建议使用命令行启动: `uvicorn main.api:app --reload`
-    uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
+    # 生产环境建议使用命令行启动: `uvicorn main:app --loop uvloop --http httptools --no-access-log`
+    uvicorn.run(app, host="0.0.0.0", port=8002, loop="uvloop", http="httptools", workers=1)
\ No newline at end of file